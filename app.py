@@ -1,10 +1,39 @@
 import os
+import atexit
+import contextlib
+import functools
+import gzip
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import dask
 import numpy as np
 import pandas as pd
 import xarray as xr
-from flask import Flask, request, jsonify, render_template
+from scipy.ndimage import map_coordinates
+from flask import Flask, Response, request, jsonify, render_template
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 
+try:
+    import orjson
+except ImportError:  # keep Flask's stdlib json provider
+    orjson = None
+
+try:
+    from flask_compress import Compress
+except ImportError:  # responses go out uncompressed
+    Compress = None
+
+try:
+    from numba import float32, njit, prange, threading_layer, types
+except ImportError:  # fall back to numexpr/NumPy in compute_hsi
+    njit = None
+
+try:
+    import numexpr as ne
+except ImportError:  # fall back to the plain NumPy path in compute_hsi
+    ne = None
+
 # -----------------------------
 # CONFIGURATION
 # -----------------------------
@@ -89,6 +118,44 @@ SHARK_MODELS = {
 }
 
 
+# Row order of the per-variable parameter/weight arrays fed to the HSI kernel
+HSI_VARIABLES = ("SST", "ChlorophyllA", "SSHa", "Bathymetry")
+
+
+
+def compile_preference(prefs):
+    # Trapezoid ramp coefficients (opt_min, opt_max, tol_min, inv_left, tol_max, inv_right).
+    # A tolerance band inside the optimal range contributes no ramp, and a zero-width
+    # ramp gets an infinite slope, i.e. a hard edge at the optimal bound. The
+    # is_low_temp_opt mirror leaves the trapezoid unchanged, so it is not stored.
+    opt_min, opt_max = prefs["optimal"]
+    tol_min, tol_max = min(prefs["tolerance"][0], opt_min), max(prefs["tolerance"][1], opt_max)
+    with np.errstate(divide="ignore"):
+        inv_left = np.float32(1.0) / np.float32(opt_min - tol_min)
+        inv_right = np.float32(1.0) / np.float32(tol_max - opt_max)
+    return np.array([opt_min, opt_max, tol_min, inv_left, tol_max, inv_right], dtype=np.float32)
+
+
+# SHARK_MODELS compiled once at import: one contiguous float32 ramp row per
+# HSI_VARIABLES entry, the layout the HSI kernel reads directly. The tables are
+# read-only; requests copy one and recompile only the rows the user overrides.
+SHARK_PARAMS = {
+    name: np.stack([compile_preference(model["preferences"][var]) for var in HSI_VARIABLES])
+    for name, model in SHARK_MODELS.items()
+}
+SHARK_WEIGHTS = {
+    name: np.array([model["weights"].get(var, 0) for var in HSI_VARIABLES], dtype=np.float32)
+    for name, model in SHARK_MODELS.items()
+}
+for _table in (*SHARK_PARAMS.values(), *SHARK_WEIGHTS.values()):
+    _table.setflags(write=False)
+
+
+# Upper bound on the per-axis resolution a client may request
+MAX_N_POINTS = 1024
+# Finest native grid step (MODIS 4 km, ~1/24 deg); sampling finer only repeats pixels
+NATIVE_RES_DEG = 0.04
+
 TIME_START = pd.to_datetime("2025-08-08")
 TIME_END = pd.to_datetime("2025-08-28")
 
@@ -143,67 +210,442 @@ FILE_MAP = {
 # }
 
 BATHY_FILE = os.path.join(DATA_DIR, "GEBCO_2025_sub_ice.nc")
+# Memory-mappable GEBCO extract written by preprocess/bathy_npy.py
+BATHY_NPY = os.path.join(DATA_DIR, "bathy.npy")
+BATHY_LAT_NPY = os.path.join(DATA_DIR, "bathy_lat.npy")
+BATHY_LON_NPY = os.path.join(DATA_DIR, "bathy_lon.npy")
+# Block-averaged GEBCO at BATHY_COARSE_RES, also written by preprocess/bathy_npy.py
+BATHY_COARSE_NPZ = os.path.join(DATA_DIR, "bathy_coarse.npz")
+
+# Spatial chunking hint for dask so only the tiles around the request bbox are read
+DATASET_CHUNKS = {"lat": 512, "lon": 512, "time": 1}
+# Resolution (degrees) of the in-memory bathymetry used when the request grid is coarser
+BATHY_COARSE_RES = 0.1
+# Suffix of the rechunked copies produced by preprocess/rechunk.py
+CHUNKED_SUFFIX = ".chunked.nc"
 
 # -----------------------------
 # FLASK APP
 # -----------------------------
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Bbox", "X-Shape"])
+
+
+class ORJSONProvider(JSONProvider):
+    # HSI responses carry tens of thousands of floats; orjson encodes them several
+    # times faster than the stdlib and accepts NumPy arrays/scalars as-is.
+    option = orjson.OPT_SERIALIZE_NUMPY if orjson is not None else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.option).decode()
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the decode/encode round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.option), mimetype="application/json")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+if orjson is not None:
+    app.json = ORJSONProvider(app)
+
+# gzip/brotli for the JSON point lists; the binary format sets its own
+# Content-Encoding, which Flask-Compress leaves alone.
+if Compress is not None:
+    Compress(app)
 
 # -----------------------------
 # UTILS
 # -----------------------------
-def vectorized_normalize_preference(arr, prefs):
-    vals = np.array(arr, dtype=float)
-    out = np.zeros_like(vals, dtype=float)
-    nan_mask = np.isnan(vals)
-    out[nan_mask] = 0.0
-
-    opt_min, opt_max = prefs["optimal"]
-    tol_min, tol_max = prefs["tolerance"]
-    is_low_temp_opt = prefs.get("is_low_temp_opt", False)
-
-    if is_low_temp_opt:
-        vals_proc = -vals
-        opt_min_f, opt_max_f = -opt_max, -opt_min
-        tol_min_f, tol_max_f = -tol_max, -tol_min
-
-        mask_opt = (vals_proc >= opt_min_f) & (vals_proc <= opt_max_f)
-        mask_left = (vals_proc >= tol_min_f) & (vals_proc < opt_min_f)
-        mask_right = (vals_proc > opt_max_f) & (vals_proc <= tol_max_f)
-
-        out[mask_opt] = 1.0
-        if (opt_min_f - tol_min_f) != 0:
-            out[mask_left] = (vals_proc[mask_left] - tol_min_f) / (opt_min_f - tol_min_f)
-        if (tol_max_f - opt_max_f) != 0:
-            out[mask_right] = (tol_max_f - vals_proc[mask_right]) / (tol_max_f - opt_max_f)
+_scratch = threading.local()
+
+
+def scratch(name, shape, dtype=np.float32):
+    # Per-thread reusable buffers so consecutive requests on a worker don't
+    # re-allocate (and re-fault) the same grid-sized arrays. Only the latest
+    # shape is kept per name, so odd n_points values can't pile up memory.
+    arrs = getattr(_scratch, "arrs", None)
+    if arrs is None:
+        arrs = _scratch.arrs = {}
+    buf = arrs.get(name)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = arrs[name] = np.empty(shape, dtype=dtype)
+    return buf
+
+
+def vectorized_normalize_preference(arr, coeffs, out=None):
+    # Trapezoid ramp as min(left ramp, right ramp) clipped to [0, 1]: no masks,
+    # one elementwise pass per step. coeffs is a compile_preference row.
+    vals = np.asarray(arr, dtype=np.float32)
+    if out is None:
+        out = np.empty_like(vals)
+    right = scratch("ramp", vals.shape)
+
+    _, _, tol_min, inv_left, tol_max, inv_right = coeffs
+    with np.errstate(invalid="ignore"):
+        np.multiply(np.subtract(vals, tol_min, out=out), inv_left, out=out)
+        np.multiply(np.subtract(tol_max, vals, out=right), inv_right, out=right)
+        # fmin skips the 0 * inf NaN a hard edge produces exactly on its bound
+        np.clip(np.fmin(out, right, out=out), 0.0, 1.0, out=out)
+    # One NaN sweep: NaN inputs score 0, hard-edge 0 * inf points sit on the optimal bound (1)
+    nan_out = np.isnan(out)
+    if nan_out.any():
+        out[nan_out] = ~np.isnan(vals[nan_out])
+    return out
+
+
+if njit is not None:
+    # fastmath without the no-NaN/no-inf flags: the kernel relies on NaN checks.
+    # error_model="numpy" lets a zero-width ramp divide to inf instead of raising.
+    _FASTMATH = {"contract", "arcp", "nsz", "reassoc", "afn"}
+
+    @njit(inline="always", fastmath=_FASTMATH)
+    def _ramp(v, opt_min, opt_max, tol_min, inv_left, tol_max, inv_right):
+        # Scalar form of vectorized_normalize_preference written as selects rather
+        # than early returns, so LLVM can if-convert and vectorise the pixel loop.
+        zero = np.float32(0.0)
+        one = np.float32(1.0)
+        left = one if v >= opt_min else max(zero, (v - tol_min) * inv_left)
+        right = one if v <= opt_max else max(zero, (tol_max - v) * inv_right)
+        return zero if v != v else min(left, right)
+
+    # Explicit C-contiguous signature: compiled eagerly at import (or loaded from
+    # the on-disk cache), so no request ever pays the JIT.
+    _grid = float32[:, ::1]
+    # Read-only types also accept writable arrays, so the frozen SHARK_PARAMS /
+    # SHARK_WEIGHTS tables are passed without a copy
+    _params = types.Array(float32, 2, "C", readonly=True)
+    _weights = types.Array(float32, 1, "C", readonly=True)
+
+    @njit(_grid(_grid, _grid, _grid, _grid, _params, _weights, _grid),
+          parallel=True, fastmath=_FASTMATH, error_model="numpy", cache=True)
+    def hsi_kernel(sst, chla, ssha, elevation, params, weights, out):
+        # Fused normalize x4 + weighted sum; params/weights laid out as SHARK_PARAMS/SHARK_WEIGHTS.
+        # Depth is -elevation, and only cells below sea level are scored.
+        r, w = params, weights
+        for i in prange(out.shape[0]):
+            for j in range(out.shape[1]):
+                depth = -elevation[i, j]
+                acc = (w[0] * _ramp(sst[i, j], r[0, 0], r[0, 1], r[0, 2], r[0, 3], r[0, 4], r[0, 5])
+                       + w[1] * _ramp(chla[i, j], r[1, 0], r[1, 1], r[1, 2], r[1, 3], r[1, 4], r[1, 5])
+                       + w[2] * _ramp(ssha[i, j], r[2, 0], r[2, 1], r[2, 2], r[2, 3], r[2, 4], r[2, 5])
+                       + w[3] * _ramp(depth, r[3, 0], r[3, 1], r[3, 2], r[3, 3], r[3, 4], r[3, 5]))
+                out[i, j] = acc if depth > 0 else np.float32(np.nan)
+        return out
+
+    # Launch the parallel backend once at import. Without TBB/OpenMP Numba falls
+    # back to its workqueue layer, which must not be entered from two Flask
+    # threads at once, so kernel calls are serialised only in that case.
+    _warm = np.zeros((1, 1), dtype=np.float32)
+    hsi_kernel(_warm, _warm, _warm, _warm, np.zeros((4, 6), dtype=np.float32), np.zeros(4, dtype=np.float32), _warm)
+    _KERNEL_LOCK = threading.Lock() if threading_layer() == "workqueue" else contextlib.nullcontext()
+
+
+def _numexpr_ramp(v):
+    # vectorized_normalize_preference as nested where()s; sub-expressions stay in
+    # numexpr's block-sized scratch instead of full-grid temporaries.
+    left = f"where({v} >= omin, one, where({v} > tmin, ({v} - tmin) * il, zero))"
+    right = f"where({v} <= omax, one, where({v} < tmax, (tmax - {v}) * ir, zero))"
+    return f"where({v} != {v}, zero, where({left} < {right}, {left}, {right}))"
+
+
+# One numexpr pass per variable, accumulated into the output in the kernel's
+# order; the last pass also applies the land mask. A single fused expression
+# would need 35 operands, over the 32 NumPy 1.x allows per evaluate.
+NUMEXPR_TERMS = (
+    f"w * {_numexpr_ramp('sst')}",
+    f"acc + w * {_numexpr_ramp('chla')}",
+    f"acc + w * {_numexpr_ramp('ssha')}",
+    f"where(elev < 0, acc + w * {_numexpr_ramp('(-elev)')}, nan32)",
+)
+
+
+def _numexpr_constants(coeffs, weight):
+    opt_min, opt_max, tol_min, inv_left, tol_max, inv_right = coeffs
+    return {
+        "zero": np.float32(0.0), "one": np.float32(1.0), "nan32": np.float32(np.nan),
+        "omin": opt_min, "omax": opt_max, "tmin": tol_min, "tmax": tol_max,
+        "il": inv_left, "ir": inv_right, "w": np.float32(weight),
+    }
+
+
+def compute_hsi(sst, chla, ssha, elevation, params, weights):
+    shape = np.shape(sst)
+    hsi = scratch("hsi", shape)
+    if njit is None and ne is not None:
+        grids = {"sst": sst, "chla": chla, "ssha": ssha, "elev": elevation, "acc": hsi}
+        for expr, coeffs, w in zip(NUMEXPR_TERMS, params, weights):
+            local_dict = {**grids, **_numexpr_constants(coeffs, w)}
+            ne.evaluate(expr, local_dict=local_dict, out=hsi, casting="same_kind")
+        return hsi
+    if njit is None:
+        hsi[:] = 0.0
+        norm = scratch("norm", shape)
+        for arr, p, w in zip((sst, chla, ssha, -elevation), params, weights):
+            if w == 0:
+                continue
+            vectorized_normalize_preference(arr, p, out=norm)
+            hsi += np.multiply(norm, np.float32(w), out=norm)
+        hsi[~(elevation < 0)] = np.nan
+        return hsi
+
+    arrays = [np.ascontiguousarray(a, dtype=np.float32) for a in (sst, chla, ssha, elevation)]
+    params = np.ascontiguousarray(params, dtype=np.float32)
+    weights = np.ascontiguousarray(weights, dtype=np.float32)
+    with _KERNEL_LOCK:
+        return hsi_kernel(*arrays, params, weights, hsi)
+
+
+
+
+
+
+# Weekly files serve 7 consecutive dates and BATHY never changes, so keep the
+# handles open for the lifetime of the process instead of reopening per request.
+_OPENED_DATASETS = {}
+# Flask serves requests on several threads; without this two cold requests could
+# both miss the cache and open the same file twice.
+_OPEN_LOCK = threading.Lock()
+
+
+def open_cached_dataset(path, decode_times=True):
+    with _OPEN_LOCK:
+        return _open_dataset(path, decode_times)
+
+
+@functools.lru_cache(maxsize=32)
+def _open_dataset(path, decode_times):
+    # h5py serialises access internally, so xarray's extra per-file lock is dropped
+    # to let the interpolation threads read concurrently. Values stay packed
+    # (mask_and_scale=False) and are decoded per tile by decode_values. Only SSHa
+    # is selected by date; the other files skip time decoding.
+    if path.endswith(".zarr"):
+        ds = xr.open_zarr(path, chunks=DATASET_CHUNKS, mask_and_scale=False, decode_times=decode_times)
     else:
-        mask_opt = (vals >= opt_min) & (vals <= opt_max)
-        mask_left = (vals >= tol_min) & (vals < opt_min)
-        mask_right = (vals > opt_max) & (vals <= tol_max)
+        ds = xr.open_dataset(path, engine="h5netcdf", chunks=DATASET_CHUNKS, cache=True, mask_and_scale=False,
+                             decode_times=decode_times, lock=False)
+    _OPENED_DATASETS[path, decode_times] = ds
+    # Normalise to ascending lat/lon so bbox slices work the same on every grid
+    # (MODIS stores latitude north-to-south, SSHa uses latitude/longitude names).
+    ds = ds.rename({k: v for k, v in (("latitude", "lat"), ("longitude", "lon")) if k in ds.dims})
+    if ds["lat"][0] > ds["lat"][-1]:
+        ds = ds.sortby("lat")
+    return ds
+
+
+@atexit.register
+def close_cached_datasets():
+    with _OPEN_LOCK:
+        _open_dataset.cache_clear()
+    while _OPENED_DATASETS:
+        _OPENED_DATASETS.popitem()[1].close()
+
+
+def subset_bbox(da, lat_min, lat_max, lon_min, lon_max, pad_lat, pad_lon):
+    # Keep at least two source cells around the bbox so edge points still have neighbours
+    pad_lat = max(pad_lat, 2 * abs(float(da["lat"][1] - da["lat"][0])))
+    pad_lon = max(pad_lon, 2 * abs(float(da["lon"][1] - da["lon"][0])))
+    return da.sel(lat=slice(lat_min - pad_lat, lat_max + pad_lat), lon=slice(lon_min - pad_lon, lon_max + pad_lon))
+
+
+def axis_positions(axis, points):
+    # Fractional index of each point along a monotonic ascending axis. Uniform
+    # axes (the usual case) are a single affine map; otherwise fall back to
+    # np.interp. Points off the axis map to -1 so map_coordinates yields NaN.
+    # Uniformity is judged in float64 against the axis' own rounding error, as
+    # float32 axes such as MODIS lat/lon carry ~1e-4 relative noise in their steps.
+    axis64 = np.asarray(axis, dtype=np.float64)
+    n = len(axis64)
+    step = (axis64[-1] - axis64[0]) / (n - 1)
+    fit = axis64[0] + step * np.arange(n)
+    eps = np.finfo(axis.dtype if np.issubdtype(axis.dtype, np.floating) else np.float64).eps
+    if np.abs(axis64 - fit).max() <= 4 * eps * np.abs(axis64).max():
+        positions = (points - axis64[0]) / step
+        # Match np.interp: beyond the end cells is off the axis
+        return np.where((positions < 0) | (positions > n - 1), -1.0, positions)
+    return np.interp(points, axis64, np.arange(n, dtype=np.float64), left=-1.0, right=-1.0)
+
+
+def grid_coordinates(lat_axis, lon_axis, lats, lons):
+    # Fractional (row, col) positions of the request grid on an ascending
+    # lat/lon grid; reusable for every variable sharing that grid. Positions are
+    # found per 1-D axis and only broadcast to the 2-D grid map_coordinates needs.
+    # Computed in float64 since coordinates near +/-180 need the precision.
+    if len(lat_axis) < 2 or len(lon_axis) < 2:
+        return None
+    rows = axis_positions(lat_axis, lats)[:, None]
+    cols = axis_positions(lon_axis, lons)[None, :]
+    return np.stack(np.broadcast_arrays(rows, cols))
+
+
+def bilinear(vals2d, coords, shape):
+    if coords is None:
+        return np.full(shape, np.nan, dtype=np.float32)
+    # Points off the tile, or touching a NaN cell, come back as NaN
+    return map_coordinates(vals2d, coords, output=np.float32, order=1, mode="constant", cval=np.nan)
+
+
+def tile_axes(tile):
+    return tile["lat"].values, tile["lon"].values
+
+
+def cf_params(attrs):
+    fills = [attrs[k] for k in ("_FillValue", "missing_value") if k in attrs]
+    return np.ravel(fills), attrs.get("scale_factor", 1.0), attrs.get("add_offset", 0.0)
+
+
+def decode_values(raw, attrs):
+    # CF mask-and-scale straight into float32, on the tile only. Tiles already
+    # stored as float32 (e.g. chlor_a) are decoded in place instead of copied.
+    fills, scale, offset = cf_params(attrs)
+    vals = np.asarray(raw, dtype=np.float32)
+    if not vals.flags.writeable:
+        vals = vals.copy()
+    if fills.size:
+        vals[np.isin(raw, fills)] = np.nan
+    if scale != 1.0:
+        vals *= np.float32(scale)
+    if offset != 0.0:
+        vals += np.float32(offset)
+    return vals
+
+
+def decode_tile(tile):
+    # Lazy CF decode: dask runs decode_values per chunk inside the same graph
+    # that reads them, so decoding is parallel and no packed tile is kept around
+    return xr.apply_ufunc(
+        decode_values, tile, kwargs={"attrs": tile.attrs}, dask="parallelized", output_dtypes=[np.float32],
+    )
+
+
+def tile_values(tile):
+    return tile.transpose("lat", "lon").values
+
+
+# Shared by all requests: one worker per dataset (CHL-A, SST, SSHa, BATHY), so
+# requests don't pay thread start-up and concurrent requests can't oversubscribe.
+_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="interp")
+
+
+def interpolate_tiles(tiles, lats, lons):
+    # Grid coordinates are computed once per distinct source grid: CHL-A and SST
+    # share the MODIS 4 km grid, so only SSHa and BATHY need their own.
+    # Materialise every lazy tile in one dask scheduler run, so chunk reads
+    # and decoding across all files are issued together rather than file by file.
+    tiles = dask.compute(*(decode_tile(tile) for tile in tiles))
+
+    grids = []
+    jobs = []
+    for tile in tiles:
+        lat_axis, lon_axis = tile_axes(tile)
+        for g_lat, g_lon, coords in grids:
+            if np.array_equal(g_lat, lat_axis) and np.array_equal(g_lon, lon_axis):
+                break
+        else:
+            coords = grid_coordinates(lat_axis, lon_axis, lats, lons)
+            grids.append((lat_axis, lon_axis, coords))
+        jobs.append((tile, coords))
+
+    # Resampling is independent per tile and releases the GIL in scipy, so run
+    # the tiles concurrently.
+    def interp_one(tile, coords):
+        return bilinear(tile_values(tile), coords, (len(lats), len(lons)))
+
+    futures = [_POOL.submit(interp_one, tile, coords) for tile, coords in jobs]
+    return [f.result() for f in futures]
+
 
-        out[mask_opt] = 1.0
-        if (opt_min - tol_min) != 0:
-            out[mask_left] = (vals[mask_left] - tol_min) / (opt_min - tol_min)
-        if (tol_max - opt_max) != 0:
-            out[mask_right] = (tol_max - vals[mask_right]) / (tol_max - opt_max)
+def zarr_path(path):
+    return os.path.splitext(path)[0] + ".zarr"
 
-    return np.clip(out, 0.0, 1.0)
 
+def resolve_data_path(path):
+    # Prefer the copies written by preprocess/rechunk.py: Zarr, then chunked NetCDF4
+    for candidate in (zarr_path(path), path + CHUNKED_SUFFIX):
+        if os.path.exists(candidate):
+            return candidate
+    return path
 
 
+def nearest_lookup(grid, lats, lons):
+    lat_axis, lon_axis, vals = grid
+    iy = np.rint((lats - lat_axis[0]) / (lat_axis[1] - lat_axis[0])).astype(np.intp)
+    ix = np.rint((lons - lon_axis[0]) / (lon_axis[1] - lon_axis[0])).astype(np.intp)
+    out = vals[np.ix_(np.clip(iy, 0, len(lat_axis) - 1), np.clip(ix, 0, len(lon_axis) - 1))].astype(np.float32)
+    # Off-grid points are no data, as on the bilinear path, not the edge cell's value
+    out[(iy < 0) | (iy >= len(lat_axis)), :] = np.nan
+    out[:, (ix < 0) | (ix >= len(lon_axis))] = np.nan
+    return out
 
 
+def load_coarse_bathy():
+    with np.load(BATHY_COARSE_NPZ) as f:
+        return f["lat"], f["lon"], f["elevation"]
+
+
+@functools.lru_cache(maxsize=1)
+def coarse_bathy():
+    # Only the grid precomputed offline is used: block-averaging GEBCO in a worker
+    # would stall requests for minutes. Without it requests take the bbox path.
+    if os.path.exists(BATHY_COARSE_NPZ):
+        return load_coarse_bathy()
+    print(f"[WARN] {BATHY_COARSE_NPZ} missing; run preprocess/bathy_npy.py to enable the coarse bathymetry")
+    return None
+
+
+def load_bathy_npy():
+    # Wrapping the memmap keeps it lazy: bbox slices only page in the touched rows
+    return xr.DataArray(
+        np.load(BATHY_NPY, mmap_mode="r"),
+        coords={"lat": np.load(BATHY_LAT_NPY), "lon": np.load(BATHY_LON_NPY)},
+        dims=("lat", "lon"),
+        name="elevation",
+    )
+
+
+BATHY_ELEVATION = load_bathy_npy() if os.path.exists(BATHY_NPY) else None
+
+
+@functools.lru_cache(maxsize=64)
+def bathy_on_grid(lat_min, lat_max, lon_min, lon_max, n_points):
+    # GEBCO never changes, so a viewport re-queried across dates or sharks reuses
+    # its resampled elevation. Callers round the bbox to 4 dp (~10 m) so the key
+    # is stable; at most 64 grids (4 MB each at MAX_N_POINTS) are kept.
+    lats = np.linspace(lat_min, lat_max, n_points)
+    lons = np.linspace(lon_min, lon_max, n_points)
+
+    # The in-memory coarse bathymetry is enough unless the request grid is finer than it
+    grid_step = min(lat_max - lat_min, lon_max - lon_min) / max(n_points - 1, 1)
+    coarse = coarse_bathy() if grid_step >= BATHY_COARSE_RES else None
+    if coarse is not None:
+        return nearest_lookup(coarse, lats, lons)
+
+    if BATHY_ELEVATION is not None:
+        elevation = BATHY_ELEVATION
+    else:
+        elevation = open_cached_dataset(resolve_data_path(BATHY_FILE), decode_times=False)["elevation"]
+    pad_lat = (lat_max - lat_min) / n_points * 4
+    pad_lon = (lon_max - lon_min) / n_points * 4
+    tile = subset_bbox(elevation, lat_min, lat_max, lon_min, lon_max, pad_lat, pad_lon)
+    return interpolate_tiles([tile], lats, lons)[0]
+
+
+# (chla, sst, ssha) paths per date, resolved once at import; restart the server
+# after running preprocess/ so newly written stores are picked up.
+FULL_PATHS = {
+    date: tuple(resolve_data_path(os.path.join(DATA_DIR, f)) for f in files)
+    for date, files in FILE_MAP.items()
+}
+# Date strings the API accepts, so requests skip parsing them
+VALID_DATES = frozenset(d for d in FILE_MAP if TIME_START <= pd.to_datetime(d) <= TIME_END)
+
 
 def get_dataset_paths(date_str):
-    if date_str not in FILE_MAP:
+    if date_str not in FULL_PATHS:
         raise ValueError(f"No mapped files for {date_str}")
-    chla_file, sst_file, ssha_file = FILE_MAP[date_str]
-    return (
-        os.path.join(DATA_DIR, chla_file),
-        os.path.join(DATA_DIR, sst_file),
-        os.path.join(DATA_DIR, ssha_file),
-    )
+    return FULL_PATHS[date_str]
 
 # -----------------------------
 # ENDPOINT
@@ -214,8 +656,9 @@ def calculate_hsi():
         data = request.json
         print("User sent data: ", data)
 
-        lat_min, lat_max = float(data["lat_min"]), float(data["lat_max"])
-        lon_min, lon_max = float(data["lon_min"]), float(data["lon_max"])
+        # Bounds may arrive in either order; bbox slicing and grid sizing need min <= max
+        lat_min, lat_max = sorted((float(data["lat_min"]), float(data["lat_max"])))
+        lon_min, lon_max = sorted((float(data["lon_min"]), float(data["lon_max"])))
         target_date_str = data["date"]
 
         shark_type = data.get("shark_type", "Great White Shark")
@@ -223,11 +666,9 @@ def calculate_hsi():
         if shark_type not in SHARK_MODELS:
             return jsonify({"error": f"Unknown shark type: {shark_type}"}), 400
 
-        model_data = SHARK_MODELS[shark_type]
-        current_weights = model_data["weights"].copy()
-        # print("default weights:" ,current_weights)
-        current_preferences = {k: v.copy() for k, v in model_data["preferences"].items()}
-        # print("default preferences:" ,current_preferences)
+        # The frozen defaults are used as-is; only an override takes a copy
+        current_weights = SHARK_WEIGHTS[shark_type]
+        current_params = SHARK_PARAMS[shark_type]
 
         # override weights if user provides
         user_weights = data.get("weights", {})
@@ -235,100 +676,86 @@ def calculate_hsi():
             total_weight = sum(user_weights.values())
             if not np.isclose(total_weight, 1.0):
                 return jsonify({"error": "Weights must sum to 1.0"}), 400
-            current_weights.update(user_weights)
+            current_weights = current_weights.copy()
+            for var, weight in user_weights.items():
+                if var in HSI_VARIABLES:
+                    current_weights[HSI_VARIABLES.index(var)] = weight
 
-        # print("updated weights:",current_weights)
-        # override prefs if provided
+        # override prefs if provided, patching only the rows the user touched
         user_prefs = data.get("preferences", {})
+        if user_prefs:
+            current_params = current_params.copy()
         for var, new_prefs in user_prefs.items():
-            if var in current_preferences:
-                if "optimal" in new_prefs:
-                    current_preferences[var]["optimal"] = tuple(new_prefs["optimal"])
-                if "tolerance" in new_prefs:
-                    current_preferences[var]["tolerance"] = tuple(new_prefs["tolerance"])
+            if var in HSI_VARIABLES:
+                prefs = {**SHARK_MODELS[shark_type]["preferences"][var], **new_prefs}
+                current_params[HSI_VARIABLES.index(var)] = compile_preference(prefs)
 
-        # print("updated prefs :",user_prefs)
-
-        target_date = pd.to_datetime(target_date_str)
-        if not (TIME_START <= target_date <= TIME_END):
+        if target_date_str not in VALID_DATES:
             return jsonify({"error": "Date out of range"}), 400
 
         chla_path, sst_path, ssha_path = get_dataset_paths(target_date_str)
 
-        N_POINTS = int(data.get("n_points", 100))
+        # Bounded so a single request can't allocate an arbitrarily large grid, and
+        # so the grid is no finer than the source data over this bbox
+        requested_points = int(data.get("n_points", 100))
+        native_points = int(max(lat_max - lat_min, lon_max - lon_min) / NATIVE_RES_DEG) + 1
+        N_POINTS = max(1, min(requested_points, native_points, MAX_N_POINTS))
+        if N_POINTS != requested_points:
+            print(f"[INFO] n_points clamped from {requested_points} to {N_POINTS}")
+        # Rows follow lats and columns follow lons; 2-D coordinates are only
+        # ever broadcast views, never materialised meshes
         lats = np.linspace(lat_min, lat_max, N_POINTS)
         lons = np.linspace(lon_min, lon_max, N_POINTS)
-        lon_mesh, lat_mesh = np.meshgrid(lons, lats)
 
         # ---------------- DATA EXTRACTION ----------------
-        with xr.open_dataset(chla_path, engine="netcdf4") as ds_chla, xr.open_dataset(sst_path, engine="netcdf4") as ds_sst, \
-                xr.open_dataset(ssha_path, engine="netcdf4") as ds_ssha_raw, xr.open_dataset(BATHY_FILE, engine="netcdf4") as ds_bathy:
-
-            ds_ssha = ds_ssha_raw.rename({"latitude": "lat", "longitude": "lon"})
-
-            chla_interp = ds_chla["chlor_a"].interp(lat=(("y", "x"), lat_mesh), lon=(("y", "x"), lon_mesh))
-            sst_interp = ds_sst["sst"].interp(lat=(("y", "x"), lat_mesh), lon=(("y", "x"), lon_mesh))
-
-
-
-            ssha_interp = ds_ssha["sla"].sel(
-                time=target_date_str,
-                method='nearest').interp(
-                lat=(("y", "x"), lat_mesh),
-                lon=(("y", "x"), lon_mesh))
-
-            depth_interp = ds_bathy["elevation"].interp(lat=(("y", "x"), lat_mesh), lon=(("y", "x"), lon_mesh))
-
-            chla_vals = chla_interp.values
-            sst_vals = sst_interp.values
-            ssha_vals = ssha_interp.values
-            depth_vals = depth_interp.values
-
-        # Convert depth: positive below sea level
-        depth_inv = -np.array(depth_vals, dtype=float)
-        ocean_mask = depth_inv > 0
-
-        # --- NEW LOGIC TO EXPLICITLY REMOVE LAND DATA ---
-        # Apply the ocean mask to all environmental data before normalization.
-        # This ensures we are only processing values over the ocean.
-        sst_vals[~ocean_mask] = np.nan
-        chla_vals[~ocean_mask] = np.nan
-        ssha_vals[~ocean_mask] = np.nan
-        # depth_inv is already handled by the final masking, but this is good practice
-        depth_inv[~ocean_mask] = np.nan
-        # ----------------------------------------------------
-
-
-        sst_norm = vectorized_normalize_preference(sst_vals, current_preferences["SST"])
-        chla_norm = vectorized_normalize_preference(chla_vals, current_preferences["ChlorophyllA"])
-        ssha_norm = vectorized_normalize_preference(ssha_vals, current_preferences["SSHa"])
-        depth_norm = vectorized_normalize_preference(depth_inv, current_preferences["Bathymetry"])
-
-
-
-
-        final_hsi = (
-                current_weights.get("SST", 0) * sst_norm +
-                current_weights.get("ChlorophyllA", 0) * chla_norm +
-                current_weights.get("SSHa", 0) * ssha_norm +
-                current_weights.get("Bathymetry", 0) * depth_norm
-        )
-        # Remove any singleton dimensions (e.g. time dimension)
-        final_hsi = np.squeeze(final_hsi)
-
-        # Now apply the ocean mask
-        final_hsi[~ocean_mask] = np.nan
-
-
-        results = []
-        for i in range(final_hsi.shape[0]):
-            for j in range(final_hsi.shape[1]):
-                if not np.isnan(final_hsi[i, j]):
-                    results.append({
-                        "lat": float(lat_mesh[i, j]),
-                        "lon": float(lon_mesh[i, j]),
-                        "hsi": float(final_hsi[i, j])
-                    })
+        # Only read and interpolate the tile around the requested bbox
+        pad_lat = (lat_max - lat_min) / N_POINTS * 4
+        pad_lon = (lon_max - lon_min) / N_POINTS * 4
+        bbox = (lat_min, lat_max, lon_min, lon_max, pad_lat, pad_lon)
+
+        # A zero-weight variable adds 0 whatever its value, so its file is never
+        # opened or read; the kernel scores its all-NaN stand-in as 0. Depth is
+        # always needed for the land mask.
+        weight_of = dict(zip(HSI_VARIABLES, current_weights))
+        tiles = {}
+        if weight_of["ChlorophyllA"] != 0:
+            tiles["ChlorophyllA"] = subset_bbox(open_cached_dataset(chla_path, decode_times=False)["chlor_a"], *bbox)
+        if weight_of["SST"] != 0:
+            tiles["SST"] = subset_bbox(open_cached_dataset(sst_path, decode_times=False)["sst"], *bbox)
+        if weight_of["SSHa"] != 0:
+            sla = open_cached_dataset(ssha_path)["sla"].sel(time=target_date_str, method='nearest')
+            tiles["SSHa"] = subset_bbox(sla, *bbox)
+        interpolated = dict(zip(tiles, interpolate_tiles(list(tiles.values()), lats, lons)))
+        unused = np.full((N_POINTS, N_POINTS), np.nan, dtype=np.float32)
+        chla_vals, sst_vals, ssha_vals = (interpolated.get(var, unused) for var in ("ChlorophyllA", "SST", "SSHa"))
+        depth_vals = bathy_on_grid(*(round(v, 4) for v in (lat_min, lat_max, lon_min, lon_max)), N_POINTS)
+
+        # Land (elevation >= 0) comes back as NaN straight from the kernel
+        final_hsi = compute_hsi(sst_vals, chla_vals, ssha_vals, depth_vals, current_params, current_weights)
+
+        if data.get("format") == "binary":
+            # Raw float16 grid, rows from lat_min to lat_max and columns from lon_min
+            # to lon_max, NaN for land/no data. ~40x smaller than the JSON points.
+            return Response(
+                gzip.compress(final_hsi.astype(np.float16).tobytes()),
+                mimetype="application/octet-stream",
+                headers={
+                    "Content-Encoding": "gzip",
+                    "X-Bbox": f"{lat_min},{lat_max},{lon_min},{lon_max}",
+                    "X-Shape": f"{final_hsi.shape[0]}x{final_hsi.shape[1]}",
+                },
+            )
+
+        # .tolist() converts to Python floats in C; no per-cell indexing in Python.
+        # HSI is rounded in float64 so it serialises as e.g. 0.812, not 0.8119999766.
+        valid = np.isfinite(final_hsi)
+        hsi_vals = np.round(final_hsi[valid].astype(np.float64), 3)
+        lat_vals = np.broadcast_to(lats[:, None], valid.shape)[valid]
+        lon_vals = np.broadcast_to(lons[None, :], valid.shape)[valid]
+        results = [
+            {"lat": lat, "lon": lon, "hsi": hsi}
+            for lat, lon, hsi in zip(lat_vals.tolist(), lon_vals.tolist(), hsi_vals.tolist())
+        ]
         return jsonify({"data": results, "message": f"HSI computed for {len(results)} points"})
     except Exception as e:
         print("[ERROR]", e)
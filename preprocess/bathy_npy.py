@@ -0,0 +1,65 @@
+"""
+One-off extraction of GEBCO elevation into memory-mappable .npy files.
+
+Run from the repository root:
+
+    python preprocess/bathy_npy.py
+
+Writes BATHY_NPY (int16 metres, ascending lat/lon) plus its 1-D coordinate
+arrays. app.py memory-maps them at import, so requests page in only the
+bathymetry tiles they touch. Also writes BATHY_COARSE_NPZ, the block-averaged
+grid used for coarse requests, so the server never has to scan GEBCO for it.
+"""
+import os
+import sys
+
+import numpy as np
+import xarray as xr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (  # noqa: E402
+    BATHY_COARSE_NPZ, BATHY_COARSE_RES, BATHY_FILE, BATHY_LAT_NPY, BATHY_LON_NPY, BATHY_NPY, cf_params,
+    open_cached_dataset,
+)
+
+# Rows copied per step, so the global grid never has to fit in memory at once
+ROW_BLOCK = 2048
+
+
+def extract(path):
+    with xr.open_dataset(path) as ds:
+        elevation = ds["elevation"].sortby("lat").sortby("lon").transpose("lat", "lon")
+        out = np.lib.format.open_memmap(BATHY_NPY, mode="w+", dtype=np.int16, shape=elevation.shape)
+        for start in range(0, elevation.shape[0], ROW_BLOCK):
+            out[start:start + ROW_BLOCK] = elevation[start:start + ROW_BLOCK].values.astype(np.int16)
+        out.flush()
+        np.save(BATHY_LAT_NPY, elevation["lat"].values.astype(np.float64))
+        np.save(BATHY_LON_NPY, elevation["lon"].values.astype(np.float64))
+
+
+def build_coarse_bathy(ds_bathy):
+    # Block-averaged GEBCO at ~BATHY_COARSE_RES as int16 metres
+    elevation = ds_bathy["elevation"]
+    fills, scale, offset = cf_params(elevation.attrs)
+    if fills.size:
+        elevation = elevation.where(~elevation.isin(fills))
+    step = abs(float(elevation["lat"][1] - elevation["lat"][0]))
+    factor = max(1, int(round(BATHY_COARSE_RES / step)))
+    coarse = elevation.coarsen(lat=factor, lon=factor, boundary="trim").mean().compute()
+    return coarse["lat"].values, coarse["lon"].values, np.rint(coarse.values * scale + offset).astype(np.int16)
+
+
+def write_coarse(path):
+    # Opened through the server's cache so lat/lon are normalised the same way
+    lat, lon, elevation = build_coarse_bathy(open_cached_dataset(path, decode_times=False))
+    np.savez(BATHY_COARSE_NPZ, lat=lat, lon=lon, elevation=elevation)
+
+
+if __name__ == "__main__":
+    if not os.path.exists(BATHY_FILE):
+        sys.exit(f"[ERROR] missing {BATHY_FILE}")
+    extract(BATHY_FILE)
+    print("[OK]", BATHY_NPY)
+    write_coarse(BATHY_FILE)
+    print("[OK]", BATHY_COARSE_NPZ)
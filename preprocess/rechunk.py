@@ -0,0 +1,96 @@
+"""
+One-off conversion of the NASA/GEBCO inputs into spatially chunked stores.
+
+Run from the repository root:
+
+    python preprocess/rechunk.py          # <name>.nc.chunked.nc (NetCDF4)
+    python preprocess/rechunk.py --zarr   # <name>.zarr
+
+Every file referenced by FILE_MAP (plus BATHY_FILE) is rewritten next to the
+original; app.py picks these up automatically, preferring Zarr. Zarr stores
+have no per-file HDF5 lock, so the interpolation threads can read in parallel.
+"""
+import argparse
+import os
+import sys
+
+import xarray as xr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import BATHY_FILE, CHUNKED_SUFFIX, DATA_DIR, FILE_MAP, zarr_path  # noqa: E402
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+CHUNK = 512
+SPATIAL_DIMS = ("lat", "lon", "latitude", "longitude")
+# Source packing carried over to the output, so int16 + scale_factor stays int16
+PACKING_KEYS = ("dtype", "scale_factor", "add_offset", "_FillValue", "missing_value")
+
+
+def source_files():
+    files = sorted({f for files in FILE_MAP.values() for f in files})
+    return [os.path.join(DATA_DIR, f) for f in files] + [BATHY_FILE]
+
+
+def spatial_vars(ds):
+    # Gridded variables only; e.g. the MODIS palette keeps its source layout
+    return {var: da for var, da in ds.data_vars.items() if any(d in SPATIAL_DIMS for d in da.dims)}
+
+
+def packing(da):
+    return {k: da.encoding[k] for k in PACKING_KEYS if k in da.encoding}
+
+
+def dataset_chunks(ds):
+    # Spatial tiles of CHUNK x CHUNK and one time step per chunk; other dims whole
+    return {d: CHUNK if d in SPATIAL_DIMS else 1 for d in ds.dims if d in SPATIAL_DIMS or d == "time"}
+
+
+def rechunk(path):
+    out_path = path + CHUNKED_SUFFIX
+    with xr.open_dataset(path) as ds:
+        encoding = {}
+        for var, da in spatial_vars(ds).items():
+            encoding[var] = {
+                **packing(da),
+                "chunksizes": tuple(min(CHUNK, n) if d in SPATIAL_DIMS else 1 for d, n in zip(da.dims, da.shape)),
+                "zlib": True,
+                "complevel": 4,
+            }
+        ds.chunk(dataset_chunks(ds)).to_netcdf(out_path, engine="h5netcdf", encoding=encoding)
+    return out_path
+
+
+def zarr_compressor_encoding():
+    import zarr
+
+    if int(zarr.__version__.split(".")[0]) >= 3:
+        from zarr.codecs import BloscCodec
+
+        return {"compressors": (BloscCodec(cname="zstd", clevel=3, shuffle="shuffle"),)}
+    from numcodecs import Blosc
+
+    return {"compressor": Blosc(cname="zstd", clevel=3, shuffle=Blosc.SHUFFLE)}
+
+
+def convert_to_zarr(path):
+    out_path = zarr_path(path)
+    with xr.open_dataset(path) as ds:
+        encoding = {var: {**packing(da), **zarr_compressor_encoding()} for var, da in spatial_vars(ds).items()}
+        ds.chunk(dataset_chunks(ds)).to_zarr(out_path, mode="w", encoding=encoding)
+    return out_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zarr", action="store_true", help="write Zarr stores instead of chunked NetCDF4")
+    args = parser.parse_args()
+
+    convert = convert_to_zarr if args.zarr else rechunk
+    for path in source_files():
+        if not os.path.exists(path):
+            print("[SKIP] missing", path)
+            continue
+        print("[OK]", convert(path))
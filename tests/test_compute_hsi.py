@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+import app
+
+
+def reference_normalize(arr, prefs):
+    # The original mask-based vectorized_normalize_preference, kept as the oracle
+    vals = np.array(arr, dtype=float)
+    out = np.zeros_like(vals, dtype=float)
+
+    opt_min, opt_max = prefs["optimal"]
+    tol_min, tol_max = prefs["tolerance"]
+    if prefs.get("is_low_temp_opt", False):
+        vals = -vals
+        opt_min, opt_max = -opt_max, -opt_min
+        tol_min, tol_max = -tol_max, -tol_min
+
+    mask_opt = (vals >= opt_min) & (vals <= opt_max)
+    mask_left = (vals >= tol_min) & (vals < opt_min)
+    mask_right = (vals > opt_max) & (vals <= tol_max)
+    out[mask_opt] = 1.0
+    if (opt_min - tol_min) != 0:
+        out[mask_left] = (vals[mask_left] - tol_min) / (opt_min - tol_min)
+    if (tol_max - opt_max) != 0:
+        out[mask_right] = (tol_max - vals[mask_right]) / (tol_max - opt_max)
+    return np.clip(out, 0.0, 1.0)
+
+
+def reference_hsi(sst, chla, ssha, elevation, preferences, weights):
+    # The original pipeline: depth = -elevation, land and missing depth masked out
+    depth = -np.array(elevation, dtype=float)
+    ocean = depth > 0
+    hsi = sum(
+        w * reference_normalize(np.where(ocean, arr, np.nan), preferences[var])
+        for var, arr, w in zip(app.HSI_VARIABLES, (sst, chla, ssha, depth), weights)
+    )
+    hsi[~ocean] = np.nan
+    return hsi
+
+
+def sample_values(rng, prefs, shape):
+    # Spread over and past the tolerance band, with exact bound values and NaNs mixed in
+    bounds = np.array([*prefs["optimal"], *prefs["tolerance"]], dtype=np.float32)
+    lo, hi = bounds.min(), bounds.max()
+    pad = max(hi - lo, 1.0) * 0.25
+    vals = rng.uniform(lo - pad, hi + pad, shape).astype(np.float32)
+    exact = rng.random(shape) < 0.1
+    vals[exact] = rng.choice(bounds, exact.sum())
+    vals[rng.random(shape) < 0.05] = np.nan
+    return vals
+
+
+def sample_inputs(preferences, shape=(48, 53), seed=0):
+    rng = np.random.default_rng(seed)
+    sst, chla, ssha, depth = (sample_values(rng, preferences[var], shape) for var in app.HSI_VARIABLES)
+    elevation = -depth
+    # Land and the coastline itself score NaN
+    elevation[rng.random(shape) < 0.1] = rng.uniform(0, 500)
+    elevation[rng.random(shape) < 0.02] = 0.0
+    return sst, chla, ssha, elevation
+
+
+EDGE_CASES = {
+    "hard edges": {"optimal": (2.0, 5.0), "tolerance": (2.0, 5.0)},
+    "tolerance inside optimum": {"optimal": (1.0, 8.0), "tolerance": (1.5, 6.0)},
+    "one-sided ramp": {"optimal": (3.0, 4.0), "tolerance": (3.0, 9.0)},
+    "zero-width optimum": {"optimal": (0.0, 0.0), "tolerance": (-0.1, 0.1)},
+    "point optimum": {"optimal": (1.0, 1.0), "tolerance": (1.0, 1.0)},
+    "low temp optimum": {"optimal": (-1.8, 5.0), "tolerance": (-2.0, 10.0), "is_low_temp_opt": True},
+}
+
+
+def check_against_reference(preferences, weights, seed=0):
+    grids = sample_inputs(preferences, seed=seed)
+    params = np.stack([app.compile_preference(preferences[var]) for var in app.HSI_VARIABLES])
+    got = app.compute_hsi(*grids, params, np.asarray(weights, dtype=np.float32)).copy()
+    want = reference_hsi(*grids, preferences, weights)
+
+    assert got.dtype == np.float32
+    np.testing.assert_array_equal(np.isnan(got), np.isnan(want))
+    np.testing.assert_allclose(got, want, rtol=0, atol=1e-6, equal_nan=True)
+
+
+@pytest.mark.parametrize("shark", sorted(app.SHARK_MODELS))
+def test_kernel_matches_reference(shark):
+    pytest.importorskip("numba")
+    model = app.SHARK_MODELS[shark]
+    weights = [model["weights"][var] for var in app.HSI_VARIABLES]
+    check_against_reference(model["preferences"], weights)
+
+
+@pytest.mark.parametrize("case", sorted(EDGE_CASES))
+def test_kernel_edge_cases_match_reference(case):
+    pytest.importorskip("numba")
+    preferences = {var: EDGE_CASES[case] for var in app.HSI_VARIABLES}
+    check_against_reference(preferences, [0.1, 0.2, 0.3, 0.4], seed=len(case))
+
+
+def test_default_tables_match_compiled_preferences():
+    for shark, model in app.SHARK_MODELS.items():
+        for row, var in enumerate(app.HSI_VARIABLES):
+            np.testing.assert_array_equal(app.SHARK_PARAMS[shark][row], app.compile_preference(model["preferences"][var]))
+
+
+@pytest.mark.parametrize("shark", sorted(app.SHARK_MODELS))
+def test_numexpr_path_matches_numpy(monkeypatch, shark):
+    ne = pytest.importorskip("numexpr")
+    grids = sample_inputs(app.SHARK_MODELS[shark]["preferences"])
+    params, weights = app.SHARK_PARAMS[shark], app.SHARK_WEIGHTS[shark]
+
+    monkeypatch.setattr(app, "njit", None)
+    monkeypatch.setattr(app, "ne", ne)
+    fused = app.compute_hsi(*grids, params, weights).copy()
+    monkeypatch.setattr(app, "ne", None)
+    plain = app.compute_hsi(*grids, params, weights).copy()
+
+    assert fused.dtype == np.float32
+    np.testing.assert_array_equal(np.isnan(fused), np.isnan(plain))
+    np.testing.assert_allclose(fused, plain, atol=1e-6, equal_nan=True)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import app
+
+
+def test_decode_values_float32_tile_in_place():
+    raw = np.array([[1.0, -999.0], [2.5, 4.0]], dtype=np.float32)
+    vals = app.decode_values(raw, {"_FillValue": np.float32(-999.0), "scale_factor": 2.0, "add_offset": 1.0})
+
+    assert vals.dtype == np.float32
+    assert np.shares_memory(vals, raw)
+    np.testing.assert_array_equal(vals, [[3.0, np.nan], [6.0, 9.0]])
+
+
+def test_decode_values_packed_int16():
+    raw = np.array([[100, -32767], [-32768, 0]], dtype=np.int16)
+    attrs = {"_FillValue": np.int16(-32767), "missing_value": np.int16(-32768), "scale_factor": 0.005, "add_offset": 20.0}
+    vals = app.decode_values(raw, attrs)
+
+    assert vals.dtype == np.float32
+    np.testing.assert_allclose(vals, [[20.5, np.nan], [np.nan, 20.0]])
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.int16])
+def test_decode_values_read_only_memmap(tmp_path, dtype):
+    path = tmp_path / "tile.npy"
+    np.save(path, np.array([[1, -9], [3, 4]], dtype=dtype))
+    raw = np.load(path, mmap_mode="r")
+    vals = app.decode_values(raw, {"_FillValue": dtype(-9), "scale_factor": 0.5})
+
+    np.testing.assert_array_equal(vals, [[0.5, np.nan], [1.5, 2.0]])
+    np.testing.assert_array_equal(raw, [[1, -9], [3, 4]])
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_axis_positions_uniform(dtype):
+    # MODIS-like 1/24 deg axis; float32 storage leaves ~1e-4 relative noise in the steps
+    axis = (-20 + np.arange(260) / 24).astype(dtype)
+    points = np.linspace(-19.5, -10.0, 37)
+    expected = np.interp(points, axis.astype(np.float64), np.arange(len(axis), dtype=np.float64))
+    np.testing.assert_allclose(app.axis_positions(axis, points), expected, atol=1e-3)
+
+
+def test_axis_positions_non_uniform():
+    axis = np.array([0.0, 1.0, 3.0, 6.0])
+    np.testing.assert_allclose(app.axis_positions(axis, np.array([0.5, 2.0, 4.5, 6.0])), [0.5, 1.5, 2.5, 3.0])
+
+
+@pytest.mark.parametrize("axis", [np.arange(0.0, 5.0), np.array([0.0, 1.0, 3.0, 6.0])])
+def test_axis_positions_off_axis(axis):
+    points = np.array([axis[0] - 0.5, axis[-1] + 0.5])
+    np.testing.assert_array_equal(app.axis_positions(axis, points), [-1.0, -1.0])
+
+
+def test_nearest_lookup():
+    lat_axis, lon_axis = np.arange(0.0, 1.0, 0.1), np.arange(10.0, 12.0, 0.1)
+    vals = np.arange(200, dtype=np.int16).reshape(10, 20)
+    out = app.nearest_lookup((lat_axis, lon_axis, vals), np.array([-0.5, 0.04, 0.31, 0.9]), np.array([10.06, 11.9, 13.0]))
+
+    assert out.dtype == np.float32
+    expected = np.full((4, 3), np.nan, dtype=np.float32)
+    expected[1:, :2] = vals[np.ix_([0, 3, 9], [1, 19])]
+    np.testing.assert_array_equal(out, expected)
+
+
+@pytest.fixture
+def synthetic_data(tmp_path, monkeypatch):
+    # A small regional stand-in for the NASA/GEBCO files behind one date
+    lat, lon = np.arange(-10.0, 10.01, 0.25), np.arange(20.0, 40.01, 0.25)
+    rng = np.random.default_rng(0)
+    shape = (len(lat), len(lon))
+    coords = {"lat": lat, "lon": lon}
+    xr.Dataset({"chlor_a": (("lat", "lon"), rng.uniform(0, 2, shape).astype(np.float32))}, coords).to_netcdf(
+        tmp_path / "chla.nc", engine="h5netcdf")
+    xr.Dataset({"sst": (("lat", "lon"), rng.uniform(10, 30, shape).astype(np.float32))}, coords).to_netcdf(
+        tmp_path / "sst.nc", engine="h5netcdf")
+    time = np.array(["2025-08-10"], dtype="datetime64[ns]")
+    xr.Dataset({"sla": (("time", "latitude", "longitude"), rng.uniform(-0.2, 0.4, (1, *shape)).astype(np.float32))},
+               {"time": time, "latitude": lat, "longitude": lon}).to_netcdf(tmp_path / "ssha.nc", engine="h5netcdf")
+    xr.Dataset({"elevation": (("lat", "lon"), rng.uniform(-3000, 200, shape).astype(np.float32))}, coords).to_netcdf(
+        tmp_path / "bathy.nc", engine="h5netcdf")
+
+    monkeypatch.setitem(app.FULL_PATHS, "2025-08-10", tuple(str(tmp_path / f) for f in ("chla.nc", "sst.nc", "ssha.nc")))
+    monkeypatch.setattr(app, "BATHY_FILE", str(tmp_path / "bathy.nc"))
+    monkeypatch.setattr(app, "BATHY_ELEVATION", None)
+    monkeypatch.setattr(app, "coarse_bathy", lambda: None)
+    app.bathy_on_grid.cache_clear()
+    yield
+    app.bathy_on_grid.cache_clear()
+
+
+def post_hsi(lat_min, lat_max, lon_min, lon_max):
+    response = app.app.test_client().post("/calculate_hsi", json={
+        "lat_min": lat_min, "lat_max": lat_max, "lon_min": lon_min, "lon_max": lon_max,
+        "date": "2025-08-10", "n_points": 40,
+    })
+    assert response.status_code == 200, response.get_json()
+    return sorted((p["lat"], p["lon"], p["hsi"]) for p in response.get_json()["data"])
+
+
+@pytest.mark.usefixtures("synthetic_data")
+def test_reversed_bbox_bounds():
+    expected = post_hsi(-5, 5, 25, 35)
+    assert expected
+    assert post_hsi(5, -5, 25, 35) == expected
+    assert post_hsi(-5, 5, 35, 25) == expected
+    assert post_hsi(5, -5, 35, 25) == expected
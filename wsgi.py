@@ -0,0 +1,15 @@
+"""
+WSGI entry point for running the API under gunicorn.
+
+Run from the repository root:
+
+    gunicorn -w 4 -k gthread --threads 4 -b 0.0.0.0:80 wsgi:app
+
+Use one worker per core; HDF5 reads, scipy resampling and the HSI kernel
+release the GIL, so each worker's threads serve requests in parallel. Do not
+pass --preload: importing app.py warms the Numba parallel backend, whose
+threads do not survive a fork, and neither do any threads the interpolation
+pool (_POOL) has started. Dataset handles are opened on first use, so each
+worker gets its own handle cache either way.
+"""
+from app import app  # noqa: F401